@@ -0,0 +1,177 @@
+import numpy as np
+import os
+import json
+import hashlib
+import threading
+import queue
+import itertools
+from collections import OrderedDict
+
+
+# owner: 0 = dead, 1 = player, 2 = enemy, 3 = shrapnel, 4 = what to defend/attack, 5 = empty build area
+COLOURS = {0 : (0, 0, 0), 1 : (0, 0, 255), 2 : (255, 0, 0), 3 : (225, 115, 20), 4 : (140, 0, 200), 5 : (15, 15, 15)}
+LEVEL_DIRS = ('levels',) + tuple(d for d in os.environ.get('PVP_LEVEL_DIRS', '').split(os.pathsep) if d) # extra directories to scan
+CACHE_DIR = 'cache' # index, parsed boards and thumbnails are kept here
+THUMBNAIL_SIZE = 128 # max width/height of thumbnails in cells
+PREFETCHED_BOARDS = 8 # boards kept in memory for instant opening
+PREFETCH, THUMBNAIL = range(2) # job priorities, prefetches jump ahead of thumbnails
+
+
+
+class LevelCatalog:
+    """index of every level in LEVEL_DIRS, kept in CACHE_DIR/level_catalog.json and only re-read for files whose mtime and content hash changed
+    each entry holds the level's title, size, base counts, build area summary and content hash
+    thumbnails are made and boards prefetched by a background worker, if a name is in more than one directory the first one wins"""
+    def __init__(self, directories = LEVEL_DIRS, cache = CACHE_DIR):
+        self.directories = directories
+        self.cache = cache
+        self.index_path = os.path.join(cache, 'level_catalog.json')
+        self.boards = OrderedDict() # name : prefetched board
+        self.thumbnails = {} # name : thumbnail pixels
+        self.lock = threading.Lock() # guards self.boards between the worker and the menu
+        self.jobs = queue.PriorityQueue()
+        self.job_count = itertools.count() # tie breaker so jobs of the same priority run in order
+        self.scan()
+        threading.Thread(target=self.work, daemon=True).start()
+        for name in self.names:
+            if not os.path.exists(self.thumbnail_path(name)):
+                self.jobs.put((THUMBNAIL, next(self.job_count), name))
+
+    def scan(self):
+        """bring the index up to date with the level directories"""
+        try:
+            with open(self.index_path, 'r') as f:
+                old = json.load(f)
+        except (OSError, ValueError): # no index yet or a broken one, start fresh
+            old = {}
+        self.entries = {}
+        self.skipped = {} # json path : why it couldn't be read, these levels are left out of the catalog
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                name, extension = os.path.splitext(filename)
+                if extension != '.json' or name in self.entries:
+                    continue
+                json_path = os.path.join(directory, filename)
+                try:
+                    entry = self.scan_level(name, directory, json_path, old.get(name))
+                except (OSError, ValueError, KeyError, TypeError, IndexError) as error: # missing csv, malformed json or csv, bad build area
+                    self.skipped[json_path] = str(error)
+                    print('Skipping level', json_path, '-', str(error))
+                    continue
+                if entry:
+                    self.entries[name] = entry
+        self.names = sorted(self.entries, key=lambda name: (self.entries[name]['order'] is None, self.entries[name]['order'] or 0, name))
+        os.makedirs(self.cache, exist_ok=True)
+        with open(self.index_path, 'w') as f:
+            json.dump(self.entries, f, indent=1)
+
+    def scan_level(self, name, directory, json_path, entry):
+        """returns the index entry for one level file, reusing the old entry if the files haven't changed, or None if it isn't a level"""
+        with open(json_path, 'r') as f:
+            setup = json.load(f)
+        if 'array' not in setup: # not a level
+            return None
+        csv_path = os.path.join(directory, setup['array'])
+        mtime = max(os.path.getmtime(json_path), os.path.getmtime(csv_path))
+        if entry and entry['json'] == json_path and entry['mtime'] == mtime and os.path.exists(self.board_path(entry)):
+            return entry # untouched since last scan
+        content_hash = self.hash_files(json_path, csv_path)
+        if entry and entry['json'] == json_path and entry['hash'] == content_hash and os.path.exists(self.board_path(entry)):
+            entry['mtime'] = mtime # touched but not changed
+            return entry
+        return self.read_level(name, setup, json_path, csv_path, mtime, content_hash)
+
+    def hash_files(self, *paths):
+        content_hash = hashlib.sha1()
+        for path in paths:
+            with open(path, 'rb') as f:
+                content_hash.update(f.read())
+        return content_hash.hexdigest()
+
+    def read_level(self, name, setup, json_path, csv_path, mtime, content_hash):
+        """parse a level once and summarise it, the parsed board is saved so it never needs parsing again"""
+        array = np.genfromtxt(csv_path, delimiter=',')
+        build_area = np.zeros(array.shape, dtype=bool)
+        for rectangle in setup['build_area']:
+            build_area[rectangle[0][0] : rectangle[1][0], rectangle[0][1] : rectangle[1][1]] = True
+        bases = np.equal(array, 4)
+        entry = {'title' : setup.get('title', name.replace('_', ' ').title()),
+                 'order' : setup.get('order'), # levels without an order go after ones with, by name
+                 'json' : json_path,
+                 'mtime' : mtime,
+                 'hash' : content_hash,
+                 'size' : list(array.shape),
+                 'build_area' : setup['build_area'],
+                 'build_summary' : {'rects' : len(setup['build_area']), 'cells' : int(np.sum(build_area))},
+                 'bases' : {'player' : int(np.sum(bases & build_area)), 'enemy' : int(np.sum(bases & ~build_area))}} # same split as Game.check_bases
+        os.makedirs(os.path.join(self.cache, 'boards'), exist_ok=True)
+        np.save(self.board_path(entry), array.astype(np.uint8))
+        return entry
+
+    def board_path(self, entry):
+        return os.path.join(self.cache, 'boards', entry['hash'] + '.npy')
+
+    def thumbnail_path(self, name):
+        return os.path.join(self.cache, 'thumbnails', self.entries[name]['hash'] + '.npy')
+
+    def board(self, name):
+        """returns a level's board as a new array ready for Game, straight from memory if it was prefetched"""
+        with self.lock:
+            array = self.boards.get(name)
+        if array is None:
+            array = self.load(name)
+        return array.astype(float) # same as np.genfromtxt, and a copy so the game can't change the cached board
+
+    def prefetch(self, name):
+        """load a board in the background so opening it is instant"""
+        with self.lock:
+            if name in self.boards:
+                return
+        self.jobs.put((PREFETCH, next(self.job_count), name))
+
+    def thumbnail(self, name):
+        """returns a level's thumbnail as an RGB pixel array, or None if the worker hasn't made it yet"""
+        if name not in self.thumbnails and os.path.exists(self.thumbnail_path(name)):
+            self.thumbnails[name] = np.load(self.thumbnail_path(name))
+        return self.thumbnails.get(name)
+
+    def load(self, name):
+        array = np.load(self.board_path(self.entries[name]))
+        with self.lock:
+            self.boards[name] = array
+            self.boards.move_to_end(name)
+            if len(self.boards) > PREFETCHED_BOARDS:
+                self.boards.popitem(last=False)
+        return array
+
+    def work(self):
+        """background worker, runs jobs forever"""
+        while True:
+            job, n, name = self.jobs.get()
+            if job == PREFETCH:
+                self.load(name)
+            elif not os.path.exists(self.thumbnail_path(name)):
+                self.make_thumbnail(name)
+
+    def make_thumbnail(self, name):
+        """shrink a board to at most THUMBNAIL_SIZE cells a side, keeping the highest owner in each block so bases stay visible"""
+        entry = self.entries[name]
+        array = np.load(self.board_path(entry))
+        for rectangle in entry['build_area']: # shade empty build area like Game.draw
+            area = array[rectangle[0][0] : rectangle[1][0], rectangle[0][1] : rectangle[1][1]]
+            area[area == 0] = 5
+        factor = -(-max(array.shape) // THUMBNAIL_SIZE) # ceiling division
+        height, width = -(-array.shape[0] // factor), -(-array.shape[1] // factor)
+        array = np.pad(array, ((0, height * factor - array.shape[0]), (0, width * factor - array.shape[1])))
+        blocks = array.reshape(height, factor, width, factor)
+        cells = (blocks % 5).max(axis=(1, 3))
+        shrunk = np.where(cells == 0, np.equal(blocks, 5).any(axis=(1, 3)) * 5, cells) # build area only shows where there are no cells
+        pixels = np.zeros((width, height, 3), np.uint8) # x, y order for pygame.surfarray
+        for owner, colour in COLOURS.items():
+            pixels[np.transpose(shrunk == owner)] = colour
+        os.makedirs(os.path.join(self.cache, 'thumbnails'), exist_ok=True)
+        np.save(self.thumbnail_path(name) + '.tmp.npy', pixels)
+        os.replace(self.thumbnail_path(name) + '.tmp.npy', self.thumbnail_path(name)) # so the menu never reads a half written file
+        self.thumbnails[name] = pixels
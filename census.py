@@ -0,0 +1,312 @@
+import numpy as np
+from grid import Grid
+
+
+HALO = 1 # cells whose halos of this size touch are counted as one object
+REACH = 2 * HALO # resulting max gap between two cells of the same object
+
+# primitive objects recognised by the census: name : (rows of the seed pattern, period)
+KNOWN_OBJECTS = {'block' : (('OO',
+                             'OO'), 1),
+                 'beehive' : (('.OO.',
+                               'O..O',
+                               '.OO.'), 1),
+                 'loaf' : (('.OO.',
+                            'O..O',
+                            '.O.O',
+                            '..O.'), 1),
+                 'boat' : (('OO.',
+                            'O.O',
+                            '.O.'), 1),
+                 'ship' : (('OO.',
+                            'O.O',
+                            '.OO'), 1),
+                 'tub' : (('.O.',
+                           'O.O',
+                           '.O.'), 1),
+                 'pond' : (('.OO.',
+                            'O..O',
+                            'O..O',
+                            '.OO.'), 1),
+                 'blinker' : (('OOO',), 2),
+                 'toad' : (('.OOO',
+                            'OOO.'), 2),
+                 'beacon' : (('OO..',
+                              'OO..',
+                              '..OO',
+                              '..OO'), 2),
+                 'glider' : (('..O',
+                              'O.O',
+                              '.OO'), 4),
+                 'lwss' : (('.O..O',
+                            'O....',
+                            'O...O',
+                            'OOOO.'), 4)}
+
+# objects made of several primitives (eg a gun is blocks plus shuttles): name : (csv file, period, names of emitted objects)
+COMPOUND_OBJECTS = {'gun' : ('prefab/gun.csv', 30, ('glider',))}
+
+
+
+def pattern_key(pattern):
+    """hashable key for a boolean pattern exactly as it is oriented"""
+    return (pattern.shape, np.packbits(pattern).tobytes())
+
+
+def orientations(pattern):
+    """keys of a pattern under every rotation and flip"""
+    pattern = pattern.astype(bool)
+    return [pattern_key(np.rot90(flipped, k)) for flipped in (pattern, np.fliplr(pattern)) for k in range(4)]
+
+
+def canonical(pattern):
+    """returns a hashable key for a boolean pattern that is the same under any rotation or flip"""
+    return min(orientations(pattern))
+
+
+def components(mask):
+    """label groups of True cells in mask that are within REACH of each other, vectorised union-find
+    returns (rows, cols, labels) of every True cell, cells of the same group share a label"""
+    rows, cols = np.nonzero(mask)
+    lookup = np.full(mask.shape, -1, np.int64) # position : index into rows/cols
+    lookup[rows, cols] = np.arange(len(rows))
+    # one edge per pair of cells within REACH, only half the offsets are needed as edges go both ways
+    starts, ends = [], []
+    height, width = mask.shape
+    for dy in range(0, REACH + 1):
+        for dx in range(-REACH, REACH + 1):
+            if dy == 0 and dx <= 0:
+                continue
+            pairs = lookup[: height - dy, max(-dx, 0) : width - max(dx, 0)] # cell
+            others = lookup[dy :, max(dx, 0) : width - max(-dx, 0)] # cell at offset from it
+            both = (pairs >= 0) & (others >= 0)
+            starts.append(pairs[both])
+            ends.append(others[both])
+    starts, ends = np.concatenate(starts), np.concatenate(ends)
+    parent = np.arange(len(rows))
+    while True:
+        low, high = np.minimum(parent[starts], parent[ends]), np.maximum(parent[starts], parent[ends])
+        joined = low != high
+        if not np.any(joined):
+            break
+        np.minimum.at(parent, high[joined], low[joined]) # hook roots onto the smaller root
+        while True: # pointer jumping so every cell points straight at its root
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return rows, cols, parent
+
+
+def as_array(rows):
+    """turns a tuple of 'O' and '.' strings into an array of 1s and 0s"""
+    return np.array([[int(char == 'O') for char in row] for row in rows])
+
+
+def phases(seed, period, padding = 20):
+    """evolve a seed pattern in isolation and return the board at each generation of its period"""
+    grid = Grid(np.pad(seed.astype(int), padding))
+    boards = []
+    for n in range(period):
+        boards.append(grid.array.copy())
+        grid.update()
+    return boards
+
+
+
+class CensusObject:
+    """a single object on the board
+    cells is a (rows, cols) tuple of index arrays, bbox is (top, left, bottom, right) with exclusive bottom/right"""
+    def __init__(self, name, owner, cells, key, parts = ()):
+        self.name = name
+        self.owner = owner
+        self.cells = cells
+        self.key = key
+        self.parts = parts # ids of the primitives a compound object is made of
+        self.population = len(cells[0])
+        self.bbox = (cells[0].min(), cells[1].min(), cells[0].max() + 1, cells[1].max() + 1)
+
+
+
+class CensusIndex:
+    """hash index of canonical patterns -> object names, built once by simulating every known object"""
+    def __init__(self):
+        # every orientation of every phase is indexed, so objects on the board can be looked up as they are without canonicalising
+        self.names = {} # pattern key : name of primitive
+        for name, (rows, period) in KNOWN_OBJECTS.items():
+            for board in phases(as_array(rows), period):
+                for key in orientations(self.trim(board)):
+                    self.names[key] = name
+        self.compounds = {} # canonical key of all parts together : name of compound
+        self.part_keys = set() # keys of every primitive that shows up in a compound
+        self.anchor_keys = {} # keys of the largest part of each phase of a compound : largest extent of that compound
+        for name, (filename, period, emitted) in COMPOUND_OBJECTS.items():
+            census = Census(None, index = self)
+            keys, anchors, extent = set(), set(), 0
+            for board in phases(np.genfromtxt(filename, delimiter=','), period, padding = 40):
+                census.reset(board.shape)
+                census.update(board)
+                parts = [obj for obj in census.components.values() if obj.name not in emitted]
+                union = np.zeros(board.shape, bool)
+                for obj in parts:
+                    union[obj.cells] = True
+                    keys.update(orientations(census.crop(obj.cells)))
+                # only the largest part is an anchor, small fragments are everywhere on a busy board and would be checked constantly
+                anchors.update(orientations(census.crop(max(parts, key=lambda obj: obj.population).cells)))
+                self.compounds[canonical(self.trim(union))] = name
+                extent = max(extent, *self.trim(union).shape)
+            self.part_keys.update(keys)
+            for key in anchors - set(self.names):
+                self.anchor_keys[key] = max(self.anchor_keys.get(key, 0), extent)
+
+    def trim(self, board):
+        """crop a board to the bounding box of its living cells"""
+        rows, cols = np.nonzero(board)
+        return board[rows.min() : rows.max() + 1, cols.min() : cols.max() + 1]
+
+
+
+class Census:
+    """incremental object census of a board
+    call update() with the board every generation, only regions that changed since the last call are re-identified
+    counts is {owner : {name : count}}, objects() returns every object currently on the board"""
+    def __init__(self, shape, index = None):
+        self.index = index if index else get_index()
+        if shape:
+            self.reset(shape)
+
+    def reset(self, shape):
+        """forget everything, used when the board is replaced wholesale"""
+        self.last_array = np.zeros(shape, int)
+        self.label_map = np.zeros(shape, np.int32) # id of the object each living cell belongs to, 0 for dead
+        self.components = {} # id : CensusObject for every primitive
+        self.compounds = {} # anchor id : CensusObject for every recognised compound
+        self.compound_of = {} # primitive id : anchor id of the compound it belongs to
+        self.counts = {}
+        self.next_id = 1
+
+    def update(self, array):
+        """bring the census up to date with array"""
+        if array.shape != self.label_map.shape:
+            self.reset(array.shape)
+        rows, cols = np.nonzero(array != self.last_array)
+        if not len(rows): # nothing changed, everything can be reused
+            return
+        touched = self.touched_ids(rows, cols)
+        # break up compounds that lost a part, their surviving parts get counted on their own again
+        retry = set()
+        for anchor in {self.compound_of[n] for n in touched if n in self.compound_of}:
+            compound = self.compounds.pop(anchor)
+            self.count(compound, -1)
+            for part in compound.parts:
+                del self.compound_of[part]
+                self.count(self.components[part], 1)
+                if part not in touched:
+                    retry.add(part)
+        # remove every touched primitive, its cells that are still alive get relabelled below
+        region = [rows.min(), cols.min(), rows.max() + 1, cols.max() + 1]
+        for n in touched:
+            obj = self.components.pop(n)
+            self.count(obj, -1)
+            self.label_map[obj.cells] = 0
+            region = [min(region[0], obj.bbox[0]), min(region[1], obj.bbox[1]), max(region[2], obj.bbox[2]), max(region[3], obj.bbox[3])]
+        new_ids = self.label(array, region)
+        for n in new_ids | retry:
+            if n in self.components and self.components[n].key in self.index.anchor_keys and n not in self.compound_of:
+                self.find_compound(n)
+        self.last_array = array.copy()
+
+    def touched_ids(self, rows, cols):
+        """ids of every primitive with a cell within REACH of a changed cell"""
+        shape = self.label_map.shape
+        ids = []
+        for dy in range(-REACH, REACH + 1):
+            for dx in range(-REACH, REACH + 1):
+                ids.append(self.label_map[np.clip(rows + dy, 0, shape[0] - 1), np.clip(cols + dx, 0, shape[1] - 1)])
+        ids = np.unique(np.concatenate(ids))
+        return set(ids[ids > 0].tolist())
+
+    def label(self, array, region):
+        """label every unlabelled living cell in region (top, left, bottom, right) as new primitives, returns their ids
+        unlabelled living cells are exactly the changed and touched ones, and no untouched primitive is within REACH of them"""
+        top, left, bottom, right = region
+        mask = (array[top:bottom, left:right] != 0) & (self.label_map[top:bottom, left:right] == 0)
+        rows, cols, roots = components(mask)
+        if not len(rows):
+            return set()
+        roots, groups = np.unique(roots, return_inverse=True)
+        ids = self.next_id + groups.reshape(-1)
+        self.next_id += len(roots)
+        rows, cols = rows + top, cols + left
+        self.label_map[rows, cols] = ids
+        order = np.argsort(ids, kind='stable')
+        splits = np.flatnonzero(np.diff(ids[order])) + 1
+        for cells in np.split(order, splits): # one Python step per object rather than per cell
+            self.add(int(ids[cells[0]]), array, (rows[cells], cols[cells]))
+        return set(range(self.next_id - len(roots), self.next_id))
+
+    def add(self, n, array, cells):
+        """identify a new primitive and count it"""
+        key = pattern_key(self.crop(cells))
+        obj = CensusObject(self.index.names.get(key, 'unknown'), self.owner(array[cells]), cells, key)
+        self.components[n] = obj
+        self.count(obj, 1)
+
+    def find_compound(self, anchor):
+        """check whether the parts around an anchor primitive make up a known compound"""
+        obj = self.components[anchor]
+        extent = self.index.anchor_keys[obj.key]
+        top, left, bottom, right = obj.bbox
+        window = self.label_map[max(top - extent, 0) : bottom + extent, max(left - extent, 0) : right + extent]
+        parts = [n for n in np.unique(window[window > 0]).tolist()
+                 if self.components[n].key in self.index.part_keys and n not in self.compound_of]
+        cells = tuple(np.concatenate([self.components[n].cells[axis] for n in parts]) for axis in range(2))
+        name = self.index.compounds.get(canonical(self.crop(cells)))
+        if not name:
+            return
+        owners = [self.components[n].owner for n in parts]
+        compound = CensusObject(name, max(set(owners), key=owners.count), cells, None, parts)
+        for n in parts:
+            self.count(self.components[n], -1)
+            self.compound_of[n] = anchor
+        self.compounds[anchor] = compound
+        self.count(compound, 1)
+
+    def crop(self, cells):
+        """boolean array of cells cropped to their bounding box"""
+        pattern = np.zeros((cells[0].max() - cells[0].min() + 1, cells[1].max() - cells[1].min() + 1), bool)
+        pattern[cells[0] - cells[0].min(), cells[1] - cells[1].min()] = True
+        return pattern
+
+    def owner(self, values):
+        """most common owner among the values of an object's cells"""
+        return int(np.bincount(values.astype(int)).argmax())
+
+    def count(self, obj, change):
+        """add change to the count of obj's name under its owner"""
+        names = self.counts.setdefault(obj.owner, {})
+        names[obj.name] = names.get(obj.name, 0) + change
+        if not names[obj.name]:
+            del names[obj.name]
+            if not names:
+                del self.counts[obj.owner]
+
+    def objects(self, owner = None):
+        """list of every object on the board, compounds replace their parts"""
+        objects = [obj for n, obj in self.components.items() if n not in self.compound_of] + list(self.compounds.values())
+        if owner is None:
+            return objects
+        return [obj for obj in objects if obj.owner == owner]
+
+
+
+known_objects = None # CensusIndex shared by every Census, built by get_index() as it simulates every known object
+
+
+
+def get_index():
+    """returns the shared CensusIndex, building it the first time a Census needs it so importing census costs nothing"""
+    global known_objects
+    if known_objects is None:
+        known_objects = CensusIndex()
+    return known_objects
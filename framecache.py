@@ -0,0 +1,102 @@
+import numpy as np
+import os
+import hashlib
+from collections import OrderedDict
+from grid import Grid
+
+
+MEMORY_CAP = 32 * 1024 * 1024 # bytes of packed frames kept in memory before least recently used animations are dropped
+
+
+
+class Animation:
+    """every generation of a binary grid from a starting array, bit packed, simulated only as far as anything has asked for
+    once a generation repeats the animation has settled and later frames loop the cycle"""
+    def __init__(self, array, cache = None):
+        self.shape = array.shape
+        self.frames = [self.pack(array)]
+        self.seen = {self.frames[0] : 0} # packed frame : index, to spot when it settles
+        self.cycle_start = None # index of the first frame of the repeating cycle once settled
+        self.grid = Grid(np.array(array, int))
+        self.cache = cache
+
+    def pack(self, array):
+        return np.packbits(array.astype(bool)).tobytes()
+
+    def index(self, n):
+        """index of the stored frame that is generation n"""
+        while self.cycle_start is None and len(self.frames) <= n:
+            self.step()
+        if n >= len(self.frames): # past the end, so settled
+            n = self.cycle_start + (n - self.cycle_start) % (len(self.frames) - self.cycle_start)
+        return n
+
+    def array(self, index):
+        """unpack a stored frame into a new array"""
+        return np.unpackbits(np.frombuffer(self.frames[index], np.uint8), count = self.shape[0] * self.shape[1]).reshape(self.shape).astype(int)
+
+    def step(self):
+        self.grid.update()
+        frame = self.pack(self.grid.array)
+        if frame in self.seen:
+            self.cycle_start = self.seen[frame]
+            self.seen, self.grid = None, None # no longer needed
+            if self.cache:
+                self.cache.save(self)
+        else:
+            self.seen[frame] = len(self.frames)
+            self.frames.append(frame)
+
+    def size(self):
+        return len(self.frames) * len(self.frames[0])
+
+
+
+class FrameCache:
+    """Animations shared by every widget that starts from the same array, eg the same text at the same width and cell size
+    settled animations are also saved to directory if one is given so they survive restarts"""
+    def __init__(self, directory = None, memory_cap = MEMORY_CAP):
+        self.directory = directory
+        self.memory_cap = memory_cap
+        self.animations = OrderedDict()
+
+    def get(self, array):
+        """returns the Animation starting from array"""
+        key = (array.shape, np.packbits(array.astype(bool)).tobytes())
+        if key in self.animations:
+            self.animations.move_to_end(key)
+            return self.animations[key]
+        animation = self.load(key) or Animation(array, self)
+        self.animations[key] = animation
+        self.evict()
+        return animation
+
+    def evict(self):
+        """drop least recently used animations until under the memory cap, widgets already using one keep their reference"""
+        while len(self.animations) > 1 and sum(animation.size() for animation in self.animations.values()) > self.memory_cap:
+            self.animations.popitem(last=False)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + '.npz')
+
+    def save(self, animation):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        np.savez(self.path((animation.shape, animation.frames[0])),
+                 frames = np.frombuffer(b''.join(animation.frames), np.uint8).reshape(len(animation.frames), -1),
+                 shape = animation.shape, cycle_start = animation.cycle_start)
+
+    def load(self, key):
+        if not self.directory or not os.path.exists(self.path(key)):
+            return None
+        data = np.load(self.path(key))
+        animation = Animation(np.zeros(key[0]), self)
+        animation.frames = [frame.tobytes() for frame in data['frames']]
+        animation.cycle_start = int(data['cycle_start'])
+        animation.seen, animation.grid = None, None # already settled
+        return animation
+
+
+
+frame_cache = FrameCache(os.environ.get('PVP_ANIMATION_CACHE')) # shared by every menu, optionally stored on disk
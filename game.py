@@ -3,6 +3,12 @@ import pygame
 import time
 import json
 from grid import ColouredGrid
+from census import Census
+from journal import Journal, MARK, UNDO, SPACE, STOP
+from pipeline import SimulationWorker
+from functools import partial
+from preview import GhostPreview
+from profiler import get_profiler
 from math import ceil
 from lifegui import PrefabButton
 
@@ -13,6 +19,7 @@ BUILD_COLOUR = (30, 240, 80)
 DEFAULT_BUTTON_COLOUR = (180,180,180)
 BACKGROUND_COLOUR = (200,200,200)
 BLACK, RED, GREEN, BLUE = (0,0,0), (255, 0, 0), (0,255,0), (0,0,255)
+OWNERS = {1 : 'player', 2 : 'enemy', 3 : 'shrapnel', 4 : 'bases'} # census owner labels
 
 
 class Game:
@@ -21,10 +28,14 @@ class Game:
     array: array of cells to initialize with
     tickrate: delay between grid.update() calls in seconds
     cell_size: default size of cells in pixels (may be removed later if zooming is added)
-    border_width: size of gap between window border and grid in pixels (may be removed later if resizing is added)"""
-    def __init__(self, surface, array, tickrate = 0.1, cell_size = 20, rect = (30, 30, 600, 600), build_area = None):
+    border_width: size of gap between window border and grid in pixels (may be removed later if resizing is added)
+    journal: optional path to record every state changing input to, replay with journal.py
+    pipelined: run generations on a worker thread while this thread only handles events and draws
+    census: keep an incremental count of objects on the board in self.census, off by default as it costs more than a generation"""
+    def __init__(self, surface, array, tickrate = 0.1, cell_size = 20, rect = (30, 30, 600, 600), build_area = None, journal = None, pipelined = False, census = False):
         self.surface = surface # what to draw on
         self.grid = ColouredGrid(array) # get Grid object
+        self.census = Census(self.grid.array.shape) if census else None # incremental count of objects on the board, see census.py
         self.tickrate = tickrate # how often in seconds to call grid.update()
         self.cell_size = cell_size # starting size of cells in pixels
         self.rect = pygame.Rect(rect) # rect the grid is inside of
@@ -39,7 +50,11 @@ class Game:
         self.ingame = True # when to end game loop and return to menu
         self.game_over = False # if a base has been destroyed
         self.cycles = 1 # counter for tickrate math
-        self.colours = {0 : (0, 0, 0), 1 : (0, 0, 255), 2 : (255, 0, 0), 3 : (225, 115, 20), 4 : (140, 0, 200), 5 : (15, 15, 15), 6 : (50, 90, 255)} # colour dict for draw()
+        self.generation = 0 # number of grid.update() calls so far, used to place inputs in the journal
+        self.journal = Journal(journal, self.grid.array) if journal else None
+        self.pipelined = pipelined
+        self.worker = None # SimulationWorker while main() is running in pipelined mode
+        self.colours = {0 : (0, 0, 0), 1 : (0, 0, 255), 2 : (255, 0, 0), 3 : (225, 115, 20), 4 : (140, 0, 200), 5 : (15, 15, 15), 6 : (50, 90, 255), 7 : (20, 35, 90)} # colour dict for draw()
         self.background = BACKGROUND_COLOUR
         self.rect_surface = pygame.Surface((self.rect[2], self.rect[3])) # intermediate surface to hide rolling edge of draw()
         self.view_coords = [(self.grid.array.shape[1]*cell_size - self.rect[3]) // 2,
@@ -54,22 +69,44 @@ class Game:
                            pygame.K_RIGHT : False} # dict for whether a direction is held
         self.buttons = [PrefabButton('Glider', (660, 200, 144, 100), np.genfromtxt('prefab/glider.csv', delimiter=','), parent=self, cell_size=12),
                         PrefabButton('Glider Gun', (660, 300, 144, 100), np.genfromtxt('prefab/gun.csv', delimiter=','), parent=self, cell_size=4)]
+        self.ghost = GhostPreview() # shows where a selected prefab will be in a few generations
         self.clear_prefab() # initialize prefab related arrays
         self.last_grid = np.zeros(self.grid.array.shape) # initialize undo array to allow for checking in undo method
+        # time each phase of the main loop, does nothing unless profiling is enabled (see profiler.py)
+        self.profiler = get_profiler('game')
+        self.profiler.instrument(self, ('handle_events', 'step', 'draw_prefab', 'check_bases', 'move', 'draw'))
+        self.profiler.instrument(self.grid, ('update', 'update_cell'), prefix = 'grid.', generations = 'update')
+        if self.census:
+            self.profiler.instrument(self.census, ('update',), prefix = 'census.')
+        self.census_shown = None # counts the census text was last rendered for
+        self.census_text = []
 
 
     def main(self):
         self.start_time = time.perf_counter()
         self.surface.fill(self.background)
+        if self.pipelined:
+            self.worker = SimulationWorker(self)
+            self.frame = self.worker.frame
+            self.worker.start()
         while self.ingame:
+            self.profiler.frame()
             # get events
             self.handle_events(pygame.event.get())
+            if self.worker and self.worker.error: # crash the same way as without a worker
+                raise self.worker.error
+            if self.worker and self.worker.frame is not self.frame: # worker has published a new generation or edit
+                self.frame = self.worker.frame
+                if self.time_on:
+                    self.draw_prefab()
             if time.perf_counter() - self.start_time - self.cycles * self.tickrate > 0: # true every 'tickrate' seconds
                 self.cycles += 1
-                if self.time_on: # only run update logic if time is turned on
-                    self.grid.update()
-                    self.draw_prefab()
-                    self.check_bases()
+                if not self.worker:
+                    if self.time_on: # only run update logic if time is turned on
+                        self.step()
+                        self.draw_prefab()
+                    if self.census:
+                        self.census.update(self.grid.array) # also catches edits made while time is off
                 for button in self.buttons:
                     if button.hovered: # update all buttons that are ticked as hovered, should only ever be 1
                         button.update()
@@ -78,6 +115,40 @@ class Game:
                     self.move(direction)
             self.draw()
             time.sleep(0.01)
+        self.shutdown()
+
+
+    def shutdown(self):
+        """stop the worker and finish the journal and profile, called when leaving the game or quitting"""
+        if self.worker:
+            self.worker.stop()
+            self.worker = None
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        self.profiler.export()
+
+
+    def step(self):
+        """run one generation, called from the worker thread in pipelined mode"""
+        self.grid.update()
+        self.generation += 1
+        if self.journal:
+            self.journal.step(self.generation, self.grid.array)
+        self.check_bases()
+
+
+    def edit(self, function):
+        """run a function that changes the grid, in pipelined mode it is queued for the worker's next generation boundary"""
+        if self.worker:
+            self.worker.submit(function)
+        else:
+            function()
+
+
+    def board(self):
+        """the board as this thread should read it, in pipelined mode grid.array belongs to the worker so the latest published frame is used"""
+        return self.frame.array if self.worker else self.grid.array
     
 
     def handle_events(self, events):
@@ -99,7 +170,7 @@ class Game:
                 if event.key in (self.DIRECTIONS):
                     self.handle_direction_key(event)
                 elif event.key == pygame.K_SPACE:
-                    self.handle_space()
+                    self.edit(self.handle_space)
                 elif event.key == pygame.K_ESCAPE:
                     self.handle_escape()
                 elif event.key == pygame.K_s:
@@ -109,11 +180,12 @@ class Game:
                 elif event.key in (pygame.K_t, pygame.K_f):
                     self.flip_prefab(event)
                 elif event.key == pygame.K_z and pygame.key.get_mods() & pygame.KMOD_CTRL: # get_mods() returns a bitmask, must be bitwise &
-                    self.undo()
+                    self.edit(self.undo)
             elif event.type == pygame.KEYUP:
                 if event.key in (self.DIRECTIONS):
                     self.handle_direction_key(event)
             elif event.type == pygame.QUIT: # if x is clicked on top right of window
+                self.shutdown() # so the journal isn't cut off mid record
                 pygame.quit()
                 quit()
 
@@ -141,6 +213,7 @@ class Game:
         """clears currently selected prefab"""
         self.selected_pattern = np.zeros((1,1)) # clear selected pattern
         self.prefab_todraw_array = np.zeros(self.grid.array.shape, bool) # clear draw array
+        self.preview = None # (top, left, mask) of the prefab's future from GhostPreview.future()
 
 
     def handle_direction_key(self, event):
@@ -155,6 +228,8 @@ class Game:
         """takes the grid back one state, only works if time has not been turned on"""
         if np.any(self.last_grid) and not self.time_on: # if grid has been saved and time is off
             self.grid.array = self.last_grid
+            if self.journal:
+                self.journal.record(UNDO, self.generation)
 
 
     def handle_scroll(self, event):
@@ -179,11 +254,23 @@ class Game:
     def handle_space(self):
         """flip time_on on space press"""
         if not self.game_over:
-            if self.time_on == False:
-                self.placeholder_grid = self.grid.array.copy()
+            if self.time_on == False: # already queued behind earlier edits in pipelined mode, so the board is saved in order
+                self.save_placeholder()
             else:
-                self.grid.array = self.placeholder_grid
+                self.restore_placeholder()
             self.time_on = not self.time_on
+            if self.journal:
+                self.journal.record(SPACE, self.generation)
+
+
+    def save_placeholder(self):
+        """keep the board from before time was turned on"""
+        self.placeholder_grid = self.grid.array.copy()
+
+
+    def restore_placeholder(self):
+        """go back to the board from before time was turned on"""
+        self.grid.array = self.placeholder_grid
 
 
     def handle_escape(self):
@@ -199,7 +286,7 @@ class Game:
     def handle_click(self, event):
         """intermediary function to pass to various parts of game screen"""
         if event.type == pygame.MOUSEBUTTONDOWN:
-            self.last_grid = self.grid.array.copy() # save grid before click for undo if needed
+            self.edit(self.save_undo) # save grid before click for undo if needed
             for button in self.buttons:
                 if button.rect.collidepoint(event.pos):
                     button.function()
@@ -211,27 +298,52 @@ class Game:
                 self.handle_grid_click(event)
 
 
+    def save_undo(self):
+        """keep a copy of the grid for undo()"""
+        self.last_grid = self.grid.array.copy()
+        if self.journal:
+            self.journal.record(MARK, self.generation)
+
+
     def handle_prefab_click(self, event):
         """what do do if player clicks while a prefab is selected"""
         if event.button == 1 and not self.time_on and not self.game_over: # if left click:
-            self.grid.array = sum((self.grid.array, self.prefab_todraw_array)) # put pattern into grid
+            self.edit(partial(self.place_prefab, self.prefab_todraw_array))
             self.clear_prefab()
         elif event.button == 3: # if right click
             self.clear_prefab()
 
 
+    def place_prefab(self, prefab_array):
+        """put pattern into grid, checks time again as a queued space press may have run first"""
+        if not self.time_on and not self.game_over:
+            self.grid.array = sum((self.grid.array, prefab_array))
+            if self.journal and np.any(prefab_array):
+                self.journal.prefab(self.generation, prefab_array)
+
+
     def handle_grid_click(self, event):
         """for clicks inside grid, translate click coords to grid coords, then translate to global array
         then interact appropriately with clicked cell"""
         if not self.time_on and not self.game_over: # only do if time is stopped
             # translate to global array coords (also needs to be y,x for numpy)
             coords = [(event.pos[n] - self.rect[n] + self.view_coords[n]) // self.cell_size for n in range(2)][::-1]
+            self.edit(partial(self.click_cell, coords, event.button))
+
+
+    def click_cell(self, coords, button):
+        """interact with a clicked cell"""
+        if not self.time_on and not self.game_over: # time may have been turned on by a queued space press
             if self.in_build_area(coords): # make sure player is allowed to change cell
             # interact with clicked cell
-                if event.button == 1 and self.grid.array[coords[0], coords[1]] == 0: # on left click
+                if button == 1 and self.grid.array[coords[0], coords[1]] == 0: # on left click
                     self.grid.array[coords[0], coords[1]] = 1 # if the clicked cell is dead, make it a player owned cell
-                elif event.button == 3 and self.grid.array[coords[0], coords[1]] == 1: # on right click
+                elif button == 3 and self.grid.array[coords[0], coords[1]] == 1: # on right click
                         self.grid.array[coords[0], coords[1]] = 0 # if the clicked cell is player owned, make it dead
+                else:
+                    return
+                if self.journal:
+                    self.journal.cell(self.generation, coords, self.grid.array[coords[0], coords[1]])
 
 
     def in_build_area(self, cell):
@@ -252,6 +364,8 @@ class Game:
                 print('You won!') # TODO replace later with ingame message
             self.game_over = True
             self.time_on = False
+            if self.journal:
+                self.journal.record(STOP, self.generation)
 
 
     def move(self, direction, size = 10):
@@ -264,6 +378,7 @@ class Game:
 
     def draw_prefab(self):
         """check whether do draw prefab and create array to draw later"""
+        self.preview = None
         # translate to global array coords (also needs to be y,x for numpy) uses mouse.get_pos() instead of an event to handle scrolling and zoom
         if not self.rect.collidepoint(pygame.mouse.get_pos()):
             self.prefab_todraw_array = np.zeros(self.grid.array.shape, bool) # don't draw if mouse is outside grid
@@ -286,25 +401,32 @@ class Game:
         self.pattern_mask = np.append(np.zeros((self.pattern_mask.shape[0], coords[1]), bool), self.pattern_mask, 1) # expand left
         self.pattern_mask = np.append(self.pattern_mask, np.zeros((self.grid.array.shape[0] - self.pattern_mask.shape[0], self.pattern_mask.shape[1]), bool), 0) # expand bottom
         self.pattern_mask = np.append(self.pattern_mask, np.zeros((self.pattern_mask.shape[0], self.grid.array.shape[1] - self.pattern_mask.shape[1]), bool), 1) # expand right
-        if np.max(np.logical_and(self.pattern_mask, self.grid.array.astype(bool))): # if any cells are already living and part of the pattern
+        if np.max(np.logical_and(self.pattern_mask, self.board().astype(bool))): # if any cells are already living and part of the pattern
             self.prefab_todraw_array = np.zeros(self.grid.array.shape, bool)
             return
         else: # if it reaches this, pattern is within grid, within build area, and doesn't collide with any current cells
             self.prefab_todraw_array = self.pattern_mask.copy() # finally make the todraw array the pattern
+            if not self.time_on: # board is still, so previews can be cached
+                self.preview = self.ghost.future(self.board(), self.selected_pattern, (coords[0] - self.selected_pattern.shape[0] + 1, coords[1]))
             return
 
 
     def draw(self):
         """draw visible grid on pygame window"""
+        array = self.board() # in pipelined mode only draw published frames
         # add in build area cosmetically
-        self.grid_and_prefab = sum((self.grid.array, self.prefab_todraw_array * 6)) # add prefab cells, should already be checked for cell collisions
+        self.grid_and_prefab = sum((array, self.prefab_todraw_array * 6)) # add prefab cells, should already be checked for cell collisions
         self.draw_grid = sum((self.grid_and_prefab, (np.logical_and(self.build_area, np.logical_not(self.grid_and_prefab.astype(bool))) * 5)))
+        if self.preview: # draw prefab's future faintly on empty cells
+            top, left, future = self.preview
+            area = self.draw_grid[top : top + future.shape[0], left : left + future.shape[1]]
+            area[np.logical_and(future, np.logical_not(self.grid_and_prefab[top : top + future.shape[0], left : left + future.shape[1]].astype(bool)))] = 7
         # slice array to only operate on visible part of grid
         self.viewable_grid = self.draw_grid[self.view_coords[1] // self.cell_size : (self.view_coords[1] + self.rect[3]) // self.cell_size + 1,
                                        self.view_coords[0] // self.cell_size : (self.view_coords[0] + self.rect[2]) // self.cell_size + 1]
-        mask_list = [np.equal(self.viewable_grid, n) for n in range(7)] # create boolean masks for each type of cell (0 through 4)
+        mask_list = [np.equal(self.viewable_grid, n) for n in range(8)] # create boolean masks for each type of cell (0 through 4)
         # the next line is very densely packed to avoid wasteful memory intensive copies of potentially million item arrays. There is an explanation for how it works in commit Alpha v1.6
-        self.pixel_array = sum([np.asarray(self.colours[n]) * np.transpose(np.broadcast_to(mask_list[n][:,:,None], (mask_list[n].shape[0], mask_list[n].shape[1], 3)), (1,0,2)) for n in range(7)])
+        self.pixel_array = sum([np.asarray(self.colours[n]) * np.transpose(np.broadcast_to(mask_list[n][:,:,None], (mask_list[n].shape[0], mask_list[n].shape[1], 3)), (1,0,2)) for n in range(8)])
         self.pixel_surf = pygame.surfarray.make_surface(self.pixel_array) # make surface
         self.pixel_surf = pygame.transform.scale(self.pixel_surf, (self.pixel_surf.get_size()[0]*self.cell_size, self.pixel_surf.get_size()[1]*self.cell_size)) # scale by cell size
         self.pixel_surf.scroll(-(self.view_coords[0] % self.cell_size), -(self.view_coords[1] % self.cell_size)) # scroll surface by the offset (I think it just shifts all pixels in a direction)
@@ -312,23 +434,50 @@ class Game:
         self.rect_surface.blit(self.pixel_surf, (0,0)) # draw
         for button in self.buttons:
             button.draw(self.surface)
+        if self.census and self.profiler.overlay: # share the space below the prefab buttons
+            self.draw_census((660, 420, 280, 100))
+            self.profiler.draw(self.surface, (660, 525, 280, 105))
+        elif self.census:
+            self.draw_census((660, 420, 280, 210))
+        elif self.profiler.overlay:
+            self.profiler.draw(self.surface, (660, 420, 280, 210)) # below prefab buttons
         pygame.display.update()
 
 
+    def draw_census(self, rect):
+        """list what each owner has on the board in rect, text is only rendered again when the counts change"""
+        counts = self.frame.counts if self.worker else self.census.counts
+        if counts != self.census_shown:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.Font(None, 18)
+            lines = [OWNERS.get(owner, str(owner)) + ': ' + ', '.join(str(count) + ' ' + name for name, count in sorted(names.items(), key=lambda item: -item[1]))
+                     for owner, names in sorted(counts.items())]
+            self.census_text = [font.render(line, True, BLACK) for line in lines]
+            self.census_shown = {owner : names.copy() for owner, names in counts.items()} # census.counts changes in place
+        self.surface.fill(self.background, rect)
+        for n, line in enumerate(self.census_text):
+            if (n + 1) * 16 > rect[3]:
+                break
+            self.surface.blit(line, (rect[0], rect[1] + n * 16), (0, 0, rect[2], 16)) # cut off long lines at the edge of rect
+
+
 
 
 class LevelEditor(Game):
     """Child class for the level editor
     works very similarly to Game except for some functionality to help with level building and a save function"""
-    def __init__(self, surface, array, build_area=(((0,0),(0,0)),), cell_size=20):
-        Game.__init__(self, surface, array, build_area=build_area, cell_size=cell_size)
+    def __init__(self, surface, array, build_area=(((0,0),(0,0)),), cell_size=20, journal=None, pipelined=False, census=False):
+        Game.__init__(self, surface, array, build_area=build_area, cell_size=cell_size, journal=journal, pipelined=pipelined, census=census)
 
     def handle_space(self):
         if self.time_on == False:
-            self.placeholder_grid = self.grid.array.copy()
+            self.save_placeholder()
         else:
-            self.grid.array = self.placeholder_grid
+            self.restore_placeholder()
         self.time_on = not self.time_on
+        if self.journal:
+            self.journal.record(SPACE, self.generation)
     
     def handle_s_key(self):
         if self.time_on:
@@ -337,7 +486,7 @@ class LevelEditor(Game):
                 json.dump({'array' : 'savedgrid.csv',
                             'build_area' : self.build_rects}, f)
         else:
-            np.savetxt('savedgrid.csv', self.grid.array, '%1.0f', delimiter=",")
+            np.savetxt('savedgrid.csv', self.board(), '%1.0f', delimiter=",")
             with open('savedgrid.json', 'w') as f:
                 json.dump({'array' : 'savedgrid.csv',
                             'build_area' : self.build_rects}, f)
@@ -349,10 +498,20 @@ class LevelEditor(Game):
             # translate to global array coords (also needs to be y,x for numpy)
             coords = [(event.pos[n] - self.rect[n] + self.view_coords[n]) // self.cell_size for n in range(2)][::-1]
             print([coord-2 for coord in coords]) # for debug purposes only TODO remove
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.grid.array[coords[0], coords[1]] < 4:
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                self.edit(partial(self.click_cell, coords, event.button))
+
+    def click_cell(self, coords, button):
+        """cycle the clicked cell through every colour"""
+        if not self.time_on:
+            if button == 1 and self.grid.array[coords[0], coords[1]] < 4:
                 self.grid.array[coords[0], coords[1]] += 1 # increment when left click
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 3 and self.grid.array[coords[0], coords[1]] > 0:
+            elif button == 3 and self.grid.array[coords[0], coords[1]] > 0:
                 self.grid.array[coords[0], coords[1]] -= 1 # decrement when right click
+            else:
+                return
+            if self.journal:
+                self.journal.cell(self.generation, coords, self.grid.array[coords[0], coords[1]])
     
     def check_bases(self):
         """don't check bases in the editor"""
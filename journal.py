@@ -0,0 +1,156 @@
+import numpy as np
+import struct
+import zlib
+import hashlib
+import time
+import sys
+from grid import ColouredGrid
+
+
+# binary input log of everything that changes the board in a Game, see Journal for the layout
+MAGIC = b'PVPJ'
+VERSION = 1
+HEADER = struct.Struct('<4sBHHI') # magic, version, rows, cols, length of compressed starting board
+RECORD = struct.Struct('<BI') # record type, generation it happened in
+CELL = struct.Struct('<HHB') # row, col, new value
+STAMP = struct.Struct('<HHHH') # top, left, rows, cols of the pattern, followed by its packed bits
+HASH_SIZE = 8
+
+# record types
+STEP, CELL_SET, PREFAB, MARK, UNDO, SPACE, STOP = range(7)
+PAYLOAD_SIZES = {STEP : HASH_SIZE, CELL_SET : CELL.size, PREFAB : STAMP.size} # bytes after a record's type and generation, prefabs are followed by their bits too
+
+
+
+def board_hash(array):
+    """short hash of a board's cell values, independent of the array's dtype"""
+    return hashlib.blake2b(np.ascontiguousarray(array, np.uint8).tobytes(), digest_size=HASH_SIZE).digest()
+
+
+
+class Journal:
+    """records every state changing action of a Game with its generation number
+    layout is a header holding the zlib compressed starting board, then records of type and generation followed by:
+    STEP - hash of the board after the generation was run
+    CELL_SET - a single cell changed by a click
+    PREFAB - a pattern added onto the board
+    MARK - board saved for undo, UNDO - board restored from the last mark
+    SPACE - time toggled, STOP - time stopped by the game ending"""
+    def __init__(self, path, array):
+        self.file = open(path, 'wb')
+        board = zlib.compress(np.ascontiguousarray(array, np.uint8).tobytes())
+        self.file.write(HEADER.pack(MAGIC, VERSION, array.shape[0], array.shape[1], len(board)))
+        self.file.write(board)
+
+    def record(self, kind, generation, payload = b''):
+        self.file.write(RECORD.pack(kind, generation) + payload)
+
+    def step(self, generation, array):
+        self.record(STEP, generation, board_hash(array))
+
+    def cell(self, generation, coords, value):
+        self.record(CELL_SET, generation, CELL.pack(coords[0], coords[1], int(value)))
+
+    def prefab(self, generation, mask):
+        rows, cols = np.nonzero(mask)
+        top, left = rows.min(), cols.min()
+        pattern = mask[top : rows.max() + 1, left : cols.max() + 1]
+        self.record(PREFAB, generation, STAMP.pack(top, left, pattern.shape[0], pattern.shape[1]) + np.packbits(pattern).tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+
+class Replayer:
+    """re-executes a journal headlessly as fast as the engine allows, checking the board hash after every generation
+    grid_class can be swapped for any Grid with the same interface to compare engines on recorded games"""
+    def __init__(self, path, grid_class = ColouredGrid):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        magic, version, rows, cols, length = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + ' is not a version ' + str(VERSION) + ' journal')
+        self.offset = HEADER.size + length
+        self.start = np.frombuffer(zlib.decompress(self.data[HEADER.size : self.offset]), np.uint8).reshape(rows, cols).astype(int)
+        self.grid_class = grid_class
+
+    def run(self):
+        """replay the whole journal, returns a dict of timing and hash results"""
+        self.grid = self.grid_class(self.start.copy())
+        self.time_on = False
+        self.last_grid = np.zeros(self.start.shape)
+        self.generations = 0
+        self.mismatches = [] # generations whose hash didn't match the recording
+        self.incomplete = None # offset of a final record that was cut short
+        offset = self.offset
+        start_time = time.perf_counter()
+        while offset < len(self.data):
+            if offset + self.record_size(offset) > len(self.data): # the game was killed mid write, nothing after it to check
+                self.incomplete = offset
+                break
+            kind, generation = RECORD.unpack_from(self.data, offset)
+            offset += RECORD.size
+            if kind == STEP:
+                self.grid.update()
+                self.generations += 1
+                if board_hash(self.grid.array) != self.data[offset : offset + HASH_SIZE]:
+                    self.mismatches.append(generation)
+                offset += HASH_SIZE
+            elif kind == CELL_SET:
+                row, col, value = CELL.unpack_from(self.data, offset)
+                self.grid.array[row, col] = value
+                offset += CELL.size
+            elif kind == PREFAB:
+                top, left, rows, cols = STAMP.unpack_from(self.data, offset)
+                offset += STAMP.size
+                length = (rows * cols + 7) // 8
+                pattern = np.unpackbits(np.frombuffer(self.data, np.uint8, length, offset), count = rows * cols).reshape(rows, cols)
+                offset += length
+                mask = np.zeros(self.grid.array.shape, bool)
+                mask[top : top + rows, left : left + cols] = pattern
+                self.grid.array = sum((self.grid.array, mask)) # same as Game.handle_prefab_click
+            elif kind == MARK:
+                self.last_grid = self.grid.array.copy()
+            elif kind == UNDO:
+                self.grid.array = self.last_grid
+            elif kind == SPACE:
+                if not self.time_on:
+                    self.placeholder_grid = self.grid.array.copy()
+                else:
+                    self.grid.array = self.placeholder_grid
+                self.time_on = not self.time_on
+            elif kind == STOP:
+                self.time_on = False
+            else:
+                raise ValueError('unknown journal record type ' + str(kind))
+        seconds = time.perf_counter() - start_time
+        return {'generations' : self.generations,
+                'seconds' : seconds,
+                'generations_per_second' : self.generations / seconds if seconds else 0,
+                'mismatches' : self.mismatches,
+                'incomplete' : self.incomplete}
+
+    def record_size(self, offset):
+        """bytes taken by the record starting at offset, going by its header"""
+        if offset + RECORD.size > len(self.data):
+            return RECORD.size
+        kind = self.data[offset]
+        size = RECORD.size + PAYLOAD_SIZES.get(kind, 0)
+        if kind == PREFAB and offset + size <= len(self.data):
+            top, left, rows, cols = STAMP.unpack_from(self.data, offset + RECORD.size)
+            size += (rows * cols + 7) // 8
+        return size
+
+
+
+if __name__ == '__main__': # python journal.py <journal file>
+    results = Replayer(sys.argv[1]).run()
+    print(results['generations'], 'generations in', round(results['seconds'], 3), 'seconds',
+          '(' + str(int(results['generations_per_second'])) + '/s)')
+    if results['incomplete'] is not None:
+        print('journal ends with an incomplete record at byte', results['incomplete'], '- the game was probably closed mid write')
+    if results['mismatches']:
+        print('state diverged at generations', results['mismatches'][:10])
+        sys.exit(1)
+    print('all hashes match')
@@ -4,6 +4,8 @@ import time
 from math import ceil
 from gridfont import font
 from grid import Grid
+from profiler import get_profiler
+from framecache import frame_cache
 
 # owner: 0 = dead, 1 = player, 2 = enemy, 3 = shrapnel, 4 = what to defend/attack
 COLOURS = {0 : (0, 0, 0), 1 : (0, 0, 255), 2 : (255, 0, 0), 3 : (225, 115, 20), 4 : (140, 0, 200)}
@@ -17,7 +19,9 @@ BLACK, RED, GREEN, BLUE = (0,0,0), (255, 0, 0), (0,255,0), (0,0,255)
 
 # GUI Abstract Classes
 class LifeTextBox():
-    """Abstract class for buttons that collapse into Conway's Game of Life sims when hovered"""
+    """Abstract class for buttons that collapse into Conway's Game of Life sims when hovered
+    keeps its scaled surface between draws and only rebuilds it when grid.array changes"""
+    rendered_array = None # grid.array the cached surface was made from
     def __init__(self, text, rect, cell_size = 5, background = BLACK, cell_colour = BLUE, centered = False, collapse = False):
         self.rect = pygame.Rect(rect)
         grid_width = rect[2] // cell_size - 4 # calculate width for font.arrange()
@@ -33,24 +37,47 @@ class LifeTextBox():
                             (self.grid.array.shape[0] - 10) * self.cell_size)
 
     def update(self):
-        self.grid.update()
+        """show the next generation, looked up from the shared frame cache instead of simulated"""
+        self.generation += 1
+        index = self.animation.index(self.generation)
+        if index != self.shown_index: # settled still lifes keep the same array so they aren't redrawn
+            self.grid.array = self.animation.array(index)
+            self.shown_index = index
     
     def hover(self, event): # event handler for MOUSEMOTION events
         if not self.hovered and self.rect.collidepoint(event.pos): # if it wasn't hovered and now is
             self.hovered = True
             self.placeholder_grid = self.grid.array
+            self.animation = frame_cache.get(self.grid.array) # same text and layout always evolves the same way
+            self.generation, self.shown_index = 0, 0
         elif self.hovered and not self.rect.collidepoint(event.pos): # if it was hovered and now isn't
             self.hovered = False
             self.grid.array = self.placeholder_grid
 
+    def dirty(self):
+        """whether the grid has changed since the last draw, Grid.update() and hover() always assign a new array"""
+        return self.grid.array is not self.rendered_array
+
+    def render(self):
+        """returns the cached scaled surface, rebuilding it if the grid has changed"""
+        if self.dirty():
+            self.rendered_array = self.grid.array
+            self.rendered = self.make_surface()
+        return self.rendered
+
     def draw(self, surface):
-        """draw object on surface"""
+        """draw object on surface, returns the rect drawn over"""
+        rendered = self.render()
+        surface.blit(rendered, self.rect[0:2]) # draw on window
+        return pygame.Rect(self.rect[0:2], rendered.get_size())
+
+    def make_surface(self):
+        """turn grid into a surface scaled by cell size"""
         mask_list = [np.equal(self.grid.array, n) for n in range(2)] # create boolean masks for each type of cell (0 through 4)
         # the next line is very densely packed to avoid wasteful memory intensive copies of potentially million item arrays. There is an explanation for how it works in commit Alpha v1.6
         pixel_array = sum([np.asarray(self.colours[n]) * np.transpose(np.broadcast_to(mask_list[n][:,:,None], (mask_list[n].shape[0], mask_list[n].shape[1], 3)), (1,0,2)) for n in range(2)])
         pixel_surf = pygame.surfarray.make_surface(pixel_array[5:-5,5:-5,:]) # make surface, excluding outer 5 rows/columns
-        pixel_surf = pygame.transform.scale(pixel_surf, (pixel_surf.get_size()[0]*self.cell_size, pixel_surf.get_size()[1]*self.cell_size)) # scale by cell size
-        surface.blit(pixel_surf, self.rect[0:2]) # draw on window
+        return pygame.transform.scale(pixel_surf, (pixel_surf.get_size()[0]*self.cell_size, pixel_surf.get_size()[1]*self.cell_size)) # scale by cell size
 
 
 
@@ -71,37 +98,50 @@ class LifeMenu:
         self.buttons = buttons
         self.background = background
         self.tickrate = tickrate
+        self.profiler = get_profiler(type(self).__name__) # does nothing unless profiling is enabled (see profiler.py)
+        self.profiler.instrument(self, ('handle_events', 'update', 'draw', 'draw_dirty'))
 
     def main(self): # main event loop
         self.restart_timer()
         self.draw()
         while True:
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.MOUSEMOTION: # find if mouse motion involved hovering or unhovering a button
-                    for button in self.buttons:
-                        button.hover(event) # pass to each button, they turn flip a var that says whether to update at update step
-                if event.type == pygame.MOUSEBUTTONUP and event.button in (1, 3):
-                    # find button and execute it's function
-                    for button in self.buttons:
-                        if isinstance(button, LifeButton):
-                            if button.rect.collidepoint(event.pos):
-                                button.function()
-                                self.restart_timer()
-                                self.draw()
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        return
-                elif event.type == pygame.QUIT:
-                    pygame.quit()
-                    quit()
+            self.profiler.frame()
+            if not self.handle_events(pygame.event.get()): # escape pressed
+                self.profiler.export()
+                return
             if time.perf_counter() - self.start_time - self.cycles * self.tickrate > 0: # true every 'tickrate' seconds
                 self.cycles += 1
-                for button in self.buttons:
-                    if button.hovered: # update all buttons that are ticked as hovered, should only ever be 1
-                        button.update()
-                self.draw()
+                self.update()
+                self.draw_dirty()
             time.sleep(0.01)
+
+    def handle_events(self, events):
+        """returns False when the menu should be closed"""
+        for event in events:
+            if event.type == pygame.MOUSEMOTION: # find if mouse motion involved hovering or unhovering a button
+                for button in self.buttons:
+                    button.hover(event) # pass to each button, they turn flip a var that says whether to update at update step
+            if event.type == pygame.MOUSEBUTTONUP and event.button in (1, 3):
+                # find button and execute it's function
+                for button in self.buttons:
+                    if isinstance(button, LifeButton):
+                        if button.rect.collidepoint(event.pos):
+                            button.function()
+                            self.restart_timer()
+                            self.draw()
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    return False
+            elif event.type == pygame.QUIT:
+                self.profiler.export()
+                pygame.quit()
+                quit()
+        return True
+
+    def update(self):
+        for button in self.buttons:
+            if button.hovered: # update all buttons that are ticked as hovered, should only ever be 1
+                button.update()
     
     def restart_timer(self): # causes issues if a button doesn't open a menu, adjust start time (modulo maybe)
         """restart update timer"""
@@ -115,6 +155,12 @@ class LifeMenu:
             button.draw(self.surface)
         pygame.display.update()
 
+    def draw_dirty(self):
+        """redraw only buttons whose grids have changed and only update their rects on the window"""
+        rects = [button.draw(self.surface) for button in self.buttons if button.dirty()]
+        if rects:
+            pygame.display.update(rects)
+
 
 
 class PrefabButton(LifeButton):
@@ -128,7 +174,6 @@ class PrefabButton(LifeButton):
         self.grid = Grid(self.expand_array(self.pattern, (self.rect[2], self.rect[3]), self.cell_size)) # create grid object from array
         self.colours = {0 : self.parent.background, 1 : BLUE}
         self.hovered = False
-        self.rect_surface = pygame.Surface((self.rect[2], self.rect[3])) # intermediate surface to hide edge of draw()
     
     def expand_array(self, array, size, cell_size):
         """fill in empty space around array to fill button size"""
@@ -147,15 +192,11 @@ class PrefabButton(LifeButton):
             new_array = np.append(new_array, np.zeros((1, new_array.shape[1])), 0)
         return new_array
 
-    def draw(self, surface):
-        """nearly inherited draw method, only difference is intermediate blit to rect surface"""
-        mask_list = [np.equal(self.grid.array, n) for n in range(2)] # create boolean masks for each type of cell (0 through 4)
-        # the next line is very densely packed to avoid wasteful memory intensive copies of potentially million item arrays. There is an explanation for how it works in commit Alpha v1.6
-        pixel_array = sum([np.asarray(self.colours[n]) * np.transpose(np.broadcast_to(mask_list[n][:,:,None], (mask_list[n].shape[0], mask_list[n].shape[1], 3)), (1,0,2)) for n in range(2)])
-        pixel_surf = pygame.surfarray.make_surface(pixel_array[5:-5,5:-5,:]) # make surface, excluding outer 5 rows/columns
-        pixel_surf = pygame.transform.scale(pixel_surf, (pixel_surf.get_size()[0]*self.cell_size, pixel_surf.get_size()[1]*self.cell_size)) # scale by cell size
-        surface.blit(self.rect_surface, self.rect) # draw intermediate surface to hide hanging pixels at edge
-        self.rect_surface.blit(pixel_surf, (0,0)) # draw
+    def make_surface(self):
+        """nearly inherited make_surface method, only difference is cropping to rect size to hide hanging pixels at edge"""
+        rect_surface = pygame.Surface((self.rect[2], self.rect[3]))
+        rect_surface.blit(LifeButton.make_surface(self), (0,0))
+        return rect_surface
 
     def function(self):
         """copy pattern to selected"""
@@ -179,12 +220,11 @@ class LifeGraphic(LifeTextBox):
                             self.visible_area[2] * self.cell_size,
                             self.visible_area[3] * self.cell_size)
 
-    def draw(self, surface):
-        """draw object on surface
-        uses self.sim_edges instead of hardcoded values"""
+    def make_surface(self):
+        """turn grid into a surface scaled by cell size
+        uses self.visible_area instead of hardcoded values"""
         mask_list = [np.equal(self.grid.array, n) for n in range(2)] # create boolean masks for each type of cell (0 through 4)
         # the next line is very densely packed to avoid wasteful memory intensive copies of potentially million item arrays. There is an explanation for how it works in commit Alpha v1.6
         pixel_array = sum([np.asarray(self.colours[n]) * np.transpose(np.broadcast_to(mask_list[n][:,:,None], (mask_list[n].shape[0], mask_list[n].shape[1], 3)), (1,0,2)) for n in range(2)])
         pixel_surf = pygame.surfarray.make_surface(pixel_array[self.visible_area[0]:self.visible_area[0]+self.visible_area[2],self.visible_area[1]:self.visible_area[1]+self.visible_area[3],:]) # make surface, excluding outer 5 rows/columns
-        pixel_surf = pygame.transform.scale(pixel_surf, (pixel_surf.get_size()[0]*self.cell_size, pixel_surf.get_size()[1]*self.cell_size)) # scale by cell size
-        surface.blit(pixel_surf, self.rect[0:2]) # draw on window
+        return pygame.transform.scale(pixel_surf, (pixel_surf.get_size()[0]*self.cell_size, pixel_surf.get_size()[1]*self.cell_size)) # scale by cell size
@@ -1,15 +1,23 @@
 import numpy as np
 import pygame
-import json
+import os
+import sys
+import profiler
 from gridfont import font
 from lifegui import LifeTextBox, LifeButton, LifeMenu, LifeGraphic
 from game import Game, LevelEditor
+from catalog import LevelCatalog
 # import subprocess # potentially for file management later
 
 # owner: 0 = dead, 1 = player, 2 = enemy, 3 = shrapnel, 4 = what to defend/attack
 COLOURS = {0 : (0, 0, 0), 1 : (0, 0, 255), 2 : (255, 0, 0), 3 : (225, 115, 20), 4 : (140, 0, 200)}
 # some temporary colour definitions for easier GUI dev
 BLACK, RED, GREEN, BLUE = (0,0,0), (255, 0, 0), (0,255,0), (0,0,255)
+CENSUS = bool(os.environ.get('PVP_CENSUS')) # count objects on the board every generation and list them next to the board
+PIPELINED = bool(os.environ.get('PVP_PIPELINED')) # run generations on a worker thread, opt in as it only helps with a spare core
+LEVEL_SLOTS = ((150,100,300,75), (150,205,300,75), (150,310,300,75),
+               (510,100,300,75), (510,205,300,75), (510,310,300,75),
+               (330,415,300,75)) # where each level on a page of the level select goes, 7 so the tutorials fit on one page
 
 
 
@@ -35,7 +43,7 @@ class LevelEditorButton(LifeButton):
         LifeButton.function(self)
         array = np.zeros((104,104))
         build_area = (((2,52), (52,102)),)
-        level_editor = LevelEditor(window, array, build_area=build_area, cell_size=50)
+        level_editor = LevelEditor(window, array, build_area=build_area, cell_size=50, pipelined=PIPELINED, census=CENSUS)
         level_editor.main()
     
 
@@ -47,25 +55,73 @@ class SandboxButton(LifeButton):
 
     def function(self): # function to execute when button is clicked
         LifeButton.function(self)
-        game = Game(window, np.zeros((124, 124)), cell_size=20)
+        game = Game(window, np.zeros((124, 124)), cell_size=20, pipelined=PIPELINED, census=CENSUS)
         game.main()
 
 
 class LevelButton(LifeButton): # child class for buttons in level select submenu
-    def __init__(self, text, rect, filename):
+    def __init__(self, text, rect, filename, thumbnail = None):
         LifeButton.__init__(self, text, rect)
         self.filename = filename
+        self.thumbnail = thumbnail # LevelThumbnail to show this level in when hovered
+
+    def hover(self, event):
+        was_hovered = self.hovered
+        LifeButton.hover(self, event)
+        if self.hovered and not was_hovered and self.filename != None:
+            catalog.prefetch(self.filename) # load board in the background so clicking opens it instantly
+            if self.thumbnail:
+                self.thumbnail.show(self.filename)
         
     def function(self): # function to execute when button is clicked
         LifeButton.function(self)
         if self.filename == None: return
-        # run game with array loaded from csv file
-        with open('levels/' + self.filename + '.json', 'r') as f:
-            self.setup = json.load(f)
-        game = Game(window , np.genfromtxt('levels/' + self.setup['array'], delimiter=','), build_area = self.setup['build_area'])
+        # run game with array and build area from the level catalog
+        os.makedirs('journals', exist_ok=True) # last play of each level is kept for replaying bug reports with journal.py
+        game = Game(window , catalog.board(self.filename), build_area = catalog.entries[self.filename]['build_area'],
+                    journal = 'journals/' + self.filename + '.journal', pipelined = PIPELINED, census = CENSUS)
         game.main()
 
 
+class PageButton(LifeButton): # turns the page of the level select
+    def __init__(self, text, rect, menu, step):
+        LifeButton.__init__(self, text, rect)
+        self.menu = menu
+        self.step = step
+
+    def function(self): # function to execute when button is clicked
+        LifeButton.function(self)
+        self.menu.turn_page(self.step)
+
+
+class LevelThumbnail: # preview of the last hovered level, drawn like a button but can't be hovered or clicked
+    def __init__(self, rect):
+        self.rect = pygame.Rect(rect)
+        self.hovered = False
+        self.name = None
+        self.drawn = None # (name, whether its thumbnail was ready) when last drawn
+
+    def hover(self, event):
+        pass
+
+    def show(self, name):
+        self.name = name
+
+    def dirty(self):
+        return (self.name, self.name != None and catalog.thumbnail(self.name) is not None) != self.drawn
+
+    def draw(self, surface):
+        surface.fill(BLACK, self.rect)
+        pixels = catalog.thumbnail(self.name) if self.name != None else None
+        if pixels is not None: # thumbnails are made in the background, so may not be ready yet
+            scale = min(self.rect[2] / pixels.shape[0], self.rect[3] / pixels.shape[1])
+            size = (int(pixels.shape[0] * scale), int(pixels.shape[1] * scale))
+            surface.blit(pygame.transform.scale(pygame.surfarray.make_surface(pixels), size),
+                         (self.rect[0] + (self.rect[2] - size[0]) // 2, self.rect[1] + (self.rect[3] - size[1]) // 2)) # centered
+        self.drawn = (self.name, pixels is not None)
+        return self.rect
+
+
 # Define menus
 class MainMenu(LifeMenu):
     def __init__(self, surface):
@@ -84,18 +140,32 @@ class MainMenu(LifeMenu):
 
 class LevelSelect(LifeMenu):
     def __init__(self, surface):
+        self.page = 0
+        self.pages = self.paginate()
+        self.thumbnail = LevelThumbnail((400,505,160,140))
         LifeMenu.__init__(self, surface, BLACK, self.init_buttons())
 
-    def init_buttons(self): # creates all buttons in the menu and returns them
-        return (
-            LevelButton('Life', (150,100,300,75), 'tutorial_1'),
-            LevelButton('Building', (150,205,300,75), 'tutorial_2'),
-            LevelButton('The Board', (150,310,300,75), 'tutorial_3'),
-            LevelButton('Bases', (510,100,300,75), 'tutorial_4'),
-            LevelButton('Enemies', (510,205,300,75), 'tutorial_5'),
-            LevelButton('Complexity', (510,310,300,75), 'tutorial_6'),
-            LevelButton('Final Level', (330,415,300,75), 'tutorial_7')
-        )
+    def paginate(self): # returns (heading, names) of every page
+        # levels with an order (the tutorial sequence) come first, levels without one start on their own pages so they never split it
+        ordered = [name for name in catalog.names if catalog.entries[name]['order'] is not None]
+        others = [name for name in catalog.names if catalog.entries[name]['order'] is None]
+        return [(heading, section[n : n + len(LEVEL_SLOTS)]) for heading, section in (('Tutorials', ordered), ('Other Levels', others))
+                for n in range(0, len(section), len(LEVEL_SLOTS))] or [('Levels', [])]
+
+    def init_buttons(self): # creates all buttons on the current page of the catalog and returns them
+        heading, names = self.pages[self.page]
+        buttons = [LevelButton(catalog.entries[name]['title'], rect, name, self.thumbnail) for name, rect in zip(names, LEVEL_SLOTS)]
+        buttons.append(LifeTextBox(heading, (346,40,268,28), cell_size=2, background = BLACK, cell_colour = GREEN, centered=True))
+        if self.page > 0:
+            buttons.append(PageButton('Back', (150,535,230,75), self, -1))
+        if self.page + 1 < len(self.pages):
+            buttons.append(PageButton('More', (580,535,230,75), self, 1))
+        buttons.append(self.thumbnail)
+        return tuple(buttons)
+
+    def turn_page(self, step):
+        self.page += step
+        self.buttons = self.init_buttons() # LifeMenu redraws everything after a click
 
 # this is a test menu for rendering and interacting with large text boxes, mainly for font and optimization testing
 # to use, replace the arguments for the LifeTextBox in TestMenu.init_buttons()
@@ -119,11 +189,19 @@ class LevelSelect(LifeMenu):
 #         test_menu.main()
 
 
+if '--profile' in sys.argv or '--profile-hud' in sys.argv: # same as setting PVP_PROFILE, '--profile-hud' also draws live numbers ingame
+    profiler.enable(overlay = '--profile-hud' in sys.argv)
+if '--pipelined' in sys.argv: # same as setting PVP_PIPELINED
+    PIPELINED = True
+if '--census' in sys.argv: # same as setting PVP_CENSUS
+    CENSUS = True
+
 WINDOW_WIDTH = 960
 WINDOW_HEIGHT = 660
 window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
 window.fill(BLACK)
 
+catalog = LevelCatalog()
 level_select = LevelSelect(window)
 main_menu = MainMenu(window)
 
@@ -0,0 +1,71 @@
+import numpy as np
+import sys
+import time
+from grid import ColouredGrid
+
+
+HALO = 2 # rows read above and below each band, Grid.update zeroes the outer 2 rows so band edges are thrown away
+CELL_BYTES = 100 # peak bytes per band cell while ColouredGrid updates it (its masks and neighbour counts), measured with tracemalloc
+BUDGET = 256 * 2**20 # default bytes a band may use while it is updated
+
+
+
+class MappedGrid:
+    """steps a board stored in a memory mapped .npy file, for boards too large to hold in memory
+    the board is streamed through grid_class in bands, writing into a second mapped file that becomes the board after each update
+    only one band is ever held in memory, its height is picked so updating it stays within budget bytes whatever the board width
+    the two files take turns holding the board, so path itself is overwritten from generation 2 onward, copy it first to keep it
+    band_rows: fixed band height instead of one worked out from budget"""
+    def __init__(self, path, budget = BUDGET, grid_class = ColouredGrid, band_rows = None):
+        self.path = path
+        self.next_path = path[:-len('.npy')] + '.next.npy' if path.endswith('.npy') else path + '.next.npy'
+        self.array = np.load(path, mmap_mode='r+')
+        self.back = np.lib.format.open_memmap(self.next_path, 'w+', np.uint8, self.array.shape) # back buffer for the next generation
+        self.band_rows = band_rows if band_rows else max(budget // (CELL_BYTES * self.array.shape[1]) - 2 * HALO, 1)
+        self.grid_class = grid_class
+        self.generation = 0
+
+    def update(self):
+        """run one generation, same result as Grid.update on the whole board including edge clean up"""
+        height, width = self.array.shape
+        for top in range(0, height, self.band_rows):
+            bottom = min(top + self.band_rows, height)
+            start, stop = max(top - HALO, 0), min(bottom + HALO, height) # band plus halo rows that exist
+            band = np.zeros((bottom - top + 2 * HALO, width), np.uint8) # rows past the board edge stay dead
+            band[start - top + HALO : stop - top + HALO] = self.array[start:stop]
+            grid = self.grid_class(band)
+            grid.update() # also cleans up the band's left and right edges, which are the board's
+            self.back[top:bottom] = grid.array[HALO:-HALO]
+        # clean up top and bottom edges
+        self.back[:2] = 0
+        self.back[-2:] = 0
+        self.back.flush()
+        # swap buffers
+        self.array, self.back = self.back, self.array
+        self.path, self.next_path = self.next_path, self.path
+        self.generation += 1
+
+    def close(self):
+        """flush and unmap both files, self.path is the file holding the latest generation"""
+        self.array.flush()
+        del self.array, self.back
+
+
+
+def create(path, array):
+    """write an in memory board to a .npy file MappedGrid can open"""
+    board = np.lib.format.open_memmap(path, 'w+', np.uint8, array.shape)
+    board[:] = array
+    board.flush()
+    del board
+
+
+
+if __name__ == '__main__': # python outofcore.py <board .npy> <generations> [budget in MB], the board file gets overwritten
+    grid = MappedGrid(sys.argv[1], *[int(arg) * 2**20 for arg in sys.argv[3:4]])
+    start_time = time.perf_counter()
+    for n in range(int(sys.argv[2])):
+        grid.update()
+    seconds = time.perf_counter() - start_time
+    print(grid.generation, 'generations of', grid.array.shape, 'in', round(seconds, 3), 'seconds, result in', grid.path)
+    grid.close()
@@ -0,0 +1,65 @@
+import threading
+import queue
+import time
+
+
+class Frame:
+    """an immutable snapshot of the board published by SimulationWorker for drawing"""
+    def __init__(self, generation, array, counts):
+        self.generation = generation
+        self.array = array.copy()
+        self.array.flags.writeable = False # the main thread only ever reads frames
+        self.counts = {owner : names.copy() for owner, names in counts.items()} # census counts at this generation
+
+
+
+class SimulationWorker(threading.Thread):
+    """runs a Game's generations on a separate thread so drawing and events never wait on grid.update()
+    the game's grid is the back buffer only this thread touches, every generation it is published as a new Frame (the front buffer)
+    anything that changes the grid is submitted as a command and run between generations"""
+    def __init__(self, game):
+        threading.Thread.__init__(self, daemon=True) # daemon so quitting from the main thread doesn't hang on the worker
+        self.game = game
+        self.commands = queue.Queue()
+        self.stopped = False
+        self.error = None # exception that ended the thread, re-raised on the main thread by Game.main
+        self.publish()
+
+    def run(self):
+        try:
+            self.loop()
+        except Exception as error: # otherwise the thread dies silently and the game just looks frozen
+            self.error = error
+
+    def loop(self):
+        next_tick = time.perf_counter() + self.game.tickrate
+        while not self.stopped:
+            try: # wait for the next tick, applying commands as they come in so edits show up straight away
+                command = self.commands.get(timeout=max(0, next_tick - time.perf_counter()))
+                command()
+                self.publish()
+                continue
+            except queue.Empty:
+                pass
+            next_tick += self.game.tickrate
+            if self.game.time_on: # only run update logic if time is turned on
+                self.game.step()
+            if self.game.census:
+                self.game.census.update(self.game.grid.array)
+            self.publish()
+
+    def submit(self, command):
+        """queue a function to be run at the next generation boundary"""
+        self.commands.put(command)
+
+    def publish(self):
+        counts = self.game.census.counts if self.game.census else {}
+        self.frame = Frame(self.game.generation, self.game.grid.array, counts) # reference swap, so readers never see a half written frame
+
+    def stop(self):
+        """finish the current generation and any queued commands, then end the thread"""
+        self.submit(self.halt)
+        self.join()
+
+    def halt(self):
+        self.stopped = True
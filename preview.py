@@ -0,0 +1,41 @@
+import numpy as np
+from collections import OrderedDict
+from grid import ColouredGrid
+
+
+class GhostPreview:
+    """simulates what a prefab will do if placed, only over its light cone instead of the whole board
+    after n generations only cells within n of the pattern can be affected by it, and those only depend on cells within 2n,
+    so a window that size (plus the 2 cells Grid.update clears at edges) is all that needs simulating
+    results are cached by pattern orientation, anchor and the contents of that window, least recently used first out"""
+    def __init__(self, generations = 16, cache_size = 128, grid_class = ColouredGrid):
+        self.generations = generations
+        self.cache_size = cache_size
+        self.grid_class = grid_class
+        self.cache = OrderedDict()
+
+    def future(self, board, pattern, anchor):
+        """returns (top, left, mask of living cells) for the area around pattern placed at anchor (top, left) after self.generations"""
+        pattern = pattern.astype(bool)
+        top, left = anchor
+        bottom, right = top + pattern.shape[0], left + pattern.shape[1]
+        margin = 2 * self.generations + 2 # cells that can influence the shown area
+        window = (max(top - margin, 0), max(left - margin, 0), min(bottom + margin, board.shape[0]), min(right + margin, board.shape[1]))
+        local = board[window[0] : window[2], window[1] : window[3]]
+        key = (pattern.shape, np.packbits(pattern).tobytes(), (top, left), hash(local.astype(np.uint8).tobytes()))
+        if key in self.cache: # a cell changing inside the window changes the key, so cached results are never stale
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        array = local.astype(int)
+        array[top - window[0] : bottom - window[0], left - window[1] : right - window[1]] += pattern # place pattern like Game.handle_prefab_click
+        grid = self.grid_class(array)
+        for n in range(self.generations):
+            grid.update()
+        # area within self.generations of the pattern, the rest of the window may be wrong by now
+        shown = (max(top - self.generations, 0), max(left - self.generations, 0),
+                 min(bottom + self.generations, board.shape[0]), min(right + self.generations, board.shape[1]))
+        result = (shown[0], shown[1], grid.array[shown[0] - window[0] : shown[2] - window[0], shown[1] - window[1] : shown[3] - window[1]].astype(bool))
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False) # evict least recently used
+        return result
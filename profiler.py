@@ -0,0 +1,164 @@
+import numpy as np
+import pygame
+import os
+import time
+import json
+import threading
+from collections import deque
+
+
+# profiling is off unless PVP_PROFILE is set or enable() is called before the game and menus are created
+ENABLED = bool(os.environ.get('PVP_PROFILE'))
+OVERLAY = bool(os.environ.get('PVP_PROFILE_HUD')) # draw live numbers in the game's side panel
+OUTPUT = os.environ.get('PVP_PROFILE_OUT', 'profiles') # directory sessions are exported to
+WINDOW = 300 # frames kept for rolling stats
+RATE_WINDOW = 60 # seconds kept for rolling generations/sec stats
+MAX_TRACE_EVENTS = 200000 # stop adding to the chrome trace past this to keep memory bounded
+OVERLAY_REFRESH = 0.25 # seconds between redrawing overlay text
+
+
+def enable(overlay = False):
+    """turn profiling on for everything created after this call"""
+    global ENABLED, OVERLAY
+    ENABLED = True
+    OVERLAY = OVERLAY or overlay
+
+
+def get_profiler(name):
+    """returns a Profiler if profiling is enabled, otherwise a DisabledProfiler that does nothing"""
+    return Profiler(name) if ENABLED else DisabledProfiler()
+
+
+
+class DisabledProfiler:
+    """stand in with the same interface as Profiler, instrument() wraps nothing so disabled profiling costs nothing in hot paths"""
+    overlay = False
+
+    def instrument(self, obj, names, prefix = '', generations = None):
+        pass
+
+    def frame(self):
+        pass
+
+    def export(self):
+        pass
+
+
+
+class Profiler:
+    """times methods of objects per frame of a main loop
+    keeps rolling p50/p95/p99 of frame time and generations/sec, and can export a session to JSON and chrome trace format
+    methods may be called from other threads (eg the pipelined simulation worker), their phases are labelled 'worker ' + phase"""
+    def __init__(self, name):
+        self.name = name
+        self.overlay = OVERLAY
+        self.origin = time.perf_counter()
+        self.session = time.strftime('%Y%m%d-%H%M%S')
+        self.frames = deque(maxlen=WINDOW) # (frame time, {phase : seconds}) of recent frames
+        self.rates = deque(maxlen=RATE_WINDOW) # generations in each of the last few whole seconds
+        self.frame_times = [] # every frame time this session, for export
+        self.totals = {} # phase : [seconds, calls] this session
+        self.trace = [] # chrome trace events
+        self.current = {} # phase : seconds in the frame being timed
+        self.frame_start = self.origin
+        self.second_start = self.origin
+        self.generations = 0 # generations run since second_start
+        self.generation_phase = None
+        self.text = None
+        self.text_time = 0
+        self.thread = threading.get_ident() # thread running the main loop, phases timed on any other thread are labelled as worker phases
+        self.lock = threading.Lock() # guards the per frame and session numbers between threads
+
+    def instrument(self, obj, names, prefix = '', generations = None):
+        """replace methods of obj with timed versions, generations is the name of the method that runs a generation if obj has one"""
+        for name in names:
+            setattr(obj, name, self.wrap(prefix + name, getattr(obj, name)))
+        if generations:
+            self.generation_phase = prefix + generations
+
+    def wrap(self, phase, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(phase, start, time.perf_counter())
+        return timed
+
+    def record(self, phase, start, end):
+        thread = threading.get_ident()
+        with self.lock:
+            if phase == self.generation_phase:
+                self.generations += 1
+            if thread != self.thread:
+                phase = 'worker ' + phase
+            self.current[phase] = self.current.get(phase, 0) + end - start
+            total = self.totals.setdefault(phase, [0, 0])
+            total[0] += end - start
+            total[1] += 1
+            if len(self.trace) < MAX_TRACE_EVENTS:
+                self.trace.append({'name' : phase, 'ph' : 'X', 'pid' : 0, 'tid' : thread,
+                                   'ts' : (start - self.origin) * 1e6, 'dur' : (end - start) * 1e6})
+
+    def frame(self):
+        """call once at the top of every loop of the main loop being profiled"""
+        now = time.perf_counter()
+        with self.lock:
+            self.frames.append((now - self.frame_start, self.current))
+            self.frame_times.append(now - self.frame_start)
+            self.current = {}
+            self.frame_start = now
+            while now - self.second_start >= 1:
+                self.rates.append(self.generations)
+                self.generations = 0
+                self.second_start += 1
+
+    def stats(self):
+        """rolling stats over the last WINDOW frames and RATE_WINDOW seconds"""
+        frame_times = np.array([frame[0] for frame in self.frames] or [0]) * 1000
+        rates = np.array(self.rates or [0])
+        phases = {}
+        for duration, phase_times in self.frames:
+            for phase, seconds in phase_times.items():
+                phases[phase] = phases.get(phase, 0) + seconds * 1000 / len(self.frames)
+        return {'frame_ms' : dict(zip(('p50', 'p95', 'p99'), np.percentile(frame_times, (50, 95, 99)).tolist())),
+                'generations_per_second' : dict(zip(('p50', 'p95', 'p99'), np.percentile(rates, (50, 95, 99)).tolist())),
+                'phase_ms_per_frame' : phases}
+
+    def draw(self, surface, rect):
+        """draw current stats as text in rect"""
+        if not self.text or time.perf_counter() - self.text_time > OVERLAY_REFRESH:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.Font(None, 18)
+            stats = self.stats()
+            lines = ['frame ms  p50 %.1f  p95 %.1f  p99 %.1f' % tuple(stats['frame_ms'].values()),
+                     'gen/s  p50 %.0f  p95 %.0f  p99 %.0f' % tuple(stats['generations_per_second'].values())]
+            lines += ['%s %.2f ms' % (phase, ms) for phase, ms in sorted(stats['phase_ms_per_frame'].items(), key=lambda item: -item[1])]
+            self.text = [font.render(line, True, (0, 0, 0)) for line in lines]
+            self.text_time = time.perf_counter()
+        surface.fill((200, 200, 200), rect)
+        for n, line in enumerate(self.text):
+            if (n + 1) * 16 > rect[3]:
+                break
+            surface.blit(line, (rect[0], rect[1] + n * 16))
+
+    def export(self):
+        """write session summary to OUTPUT/<name>-<session>.json and all timed calls to OUTPUT/<name>-<session>.trace.json"""
+        os.makedirs(OUTPUT, exist_ok=True)
+        path = os.path.join(OUTPUT, self.name + '-' + self.session)
+        with self.lock: # a worker may still be running
+            frames = len(self.frame_times)
+            frame_times = np.array(self.frame_times or [0]) * 1000
+            phases = {phase : {'total_ms' : seconds * 1000, 'calls' : calls} for phase, (seconds, calls) in self.totals.items()}
+            trace = list(self.trace)
+        summary = {'name' : self.name,
+                   'frames' : frames,
+                   'seconds' : time.perf_counter() - self.origin,
+                   'frame_ms' : dict(zip(('p50', 'p95', 'p99'), np.percentile(frame_times, (50, 95, 99)).tolist())),
+                   'phases' : phases,
+                   'rolling' : self.stats()}
+        with open(path + '.json', 'w') as f:
+            json.dump(summary, f, indent=1)
+        with open(path + '.trace.json', 'w') as f:
+            json.dump({'traceEvents' : trace}, f)